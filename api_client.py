@@ -1,14 +1,81 @@
 import requests
 import time
 import json
+import mmap
 import os
+import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# httpx gives us HTTP/2 + keep-alive connection reuse for concurrent fetches;
+# we fall back to plain requests if it isn't installed.
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# orjson parses/serializes number-heavy market data several times faster than
+# stdlib json; fall back to stdlib if it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ijson lets us stream markets out of a response without building the whole
+# DOM in memory; prefer the yajl2_c backend, fall back to whatever is there.
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
 
 # --- Configuration ---
 from config import USER_AGENT, CACHE_DIR
+from cache_store import CacheStore
 
 # Set Definitions
 BASE_API_URL = "https://api.pathofexile.com"
 
+# Files above this size are parsed through mmap so orjson reads straight
+# from the kernel page cache; smaller files aren't worth the setup cost
+MMAP_THRESHOLD = 64 * 1024
+
+# Parsed hours kept in memory per client for repeated analyses in a session
+MEM_CACHE_SIZE = 32
+
+# Errors we treat as "the request failed" regardless of HTTP backend
+if httpx is not None:
+    _REQUEST_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+else:
+    _REQUEST_ERRORS = (requests.exceptions.RequestException,)
+
+
+def _json_loads(data):
+    """Parse JSON from bytes/str using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    """Serialize to indented JSON bytes using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+@lru_cache(maxsize=4)
+def _read_token_file(token_file):
+    """
+    Read and parse the token file once per path.
+    auth_handler clears this cache after writing a fresh token.
+    """
+    with open(token_file, 'rb') as f:
+        return _json_loads(f.read())['access_token']
+
 
 class TradeAPIClient:
     def __init__(self, token_file="token.json", cache_dir=None):
@@ -20,16 +87,74 @@ class TradeAPIClient:
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
 
+        # Single-shard MsgPack cache; legacy per-hour JSON files are folded
+        # into it on first read and remain the fallback without msgpack
+        self._cache_store = CacheStore(self.cache_dir) if CacheStore.available() else None
+
+        # Small LRU of already-parsed hours so repeated analyses within a
+        # session never re-deserialize the same payload
+        self._mem_cache = OrderedDict()
+
         self.headers = {
             "Authorization": f"Bearer {self.access_token}",
             "User-Agent": USER_AGENT,
         }
 
+        # Pooled session so the requests path keeps TCP/TLS warm across
+        # calls instead of re-handshaking per request
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+
+        # Shared HTTP/2 client so concurrent fetches reuse one TCP/TLS
+        # connection instead of paying a handshake per request
+        if httpx is not None:
+            self._http_client = httpx.Client(
+                http2=True,
+                headers=self.headers,
+                limits=httpx.Limits(max_keepalive_connections=16),
+                timeout=30,
+            )
+        else:
+            self._http_client = None
+
+    def _remember(self, cache_key, data):
+        """Keep a parsed hour in the in-process LRU. Treat entries as read-only."""
+        self._mem_cache[cache_key] = data
+        self._mem_cache.move_to_end(cache_key)
+        while len(self._mem_cache) > MEM_CACHE_SIZE:
+            self._mem_cache.popitem(last=False)
+
+    def prewarm(self):
+        """
+        Establish a pooled TLS connection to the API host before the first
+        real request. Intended to run in a background thread at startup so
+        the handshake happens off the critical path.
+        """
+        try:
+            if self._http_client is not None:
+                self._http_client.head(BASE_API_URL, timeout=2)
+            else:
+                self.session.head(BASE_API_URL, timeout=2)
+        except Exception:
+            pass
+
+    def close(self):
+        """Close the pooled session and HTTP client."""
+        self.session.close()
+        if self._http_client is not None:
+            self._http_client.close()
+
+    def _get(self, url, stream=False):
+        """Issue a GET through the pooled httpx client when available."""
+        if self._http_client is not None and not stream:
+            return self._http_client.get(url)
+        return self.session.get(url, timeout=30, stream=stream)
+
     def _load_token(self):
         try:
-            with open(self.token_file, 'r') as f:
-                token_data = json.load(f)
-                return token_data['access_token']
+            return _read_token_file(self.token_file)
         except (FileNotFoundError, KeyError):
             raise Exception("Token file not found or invalid. Please run auth_handler.py first.")
 
@@ -47,16 +172,50 @@ class TradeAPIClient:
             url += f"/{id}"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._get(url)
             response.raise_for_status()
-            return response.json()
+            # Parse raw bytes directly to skip the extra UTF-8 decode round-trip
+            return _json_loads(response.content)
+        except _REQUEST_ERRORS as e:
+            print(f"An API error occurred: {e}")
+            error_response = getattr(e, 'response', None)
+            if error_response is not None and error_response.status_code == 429:
+                retry_after = int(error_response.headers.get('Retry-After', 60))
+                print(f"Rate limited. Waiting for {retry_after} seconds.")
+                time.sleep(retry_after)
+            return None
+
+    def iter_currency_exchange_markets(self, realm=None, id=None):
+        """
+        Streams currency exchange markets from the API one market at a time.
+        Unlike get_currency_exchange_markets, this never materializes the full
+        response dict, so peak memory stays at O(single market) for large hours.
+        :param realm: The realm to fetch data from (e.g., 'xbox', 'sony'). Defaults to 'pc'.
+        :param id: A unix timestamp to fetch data from a specific time.
+        :return: A generator yielding market dictionaries.
+        """
+        url = f"{BASE_API_URL}/currency-exchange"
+        if realm:
+            url += f"/{realm}"
+        if id:
+            url += f"/{id}"
+
+        try:
+            response = self._get(url, stream=True)
+            response.raise_for_status()
+            if ijson is not None:
+                # Decompress transparently so ijson sees plain JSON bytes
+                response.raw.decode_content = True
+                yield from ijson.items(response.raw, 'markets.item', use_float=True)
+            else:
+                # Fallback without ijson: parse the whole body and iterate it
+                yield from _json_loads(response.content).get('markets', [])
         except requests.exceptions.RequestException as e:
             print(f"An API error occurred: {e}")
             if e.response and e.response.status_code == 429:
                 retry_after = int(e.response.headers.get('Retry-After', 60))
                 print(f"Rate limited. Waiting for {retry_after} seconds.")
                 time.sleep(retry_after)
-            return None
 
     def fetch_hourly_data(self, timestamp, realm=None):
         """
@@ -70,16 +229,46 @@ class TradeAPIClient:
         Returns:
             Market data dictionary or None
         """
-        # Generate cache filename
+        # Fastest path: this hour was already parsed in this process
+        cache_key = (timestamp, realm)
+        cached = self._mem_cache.get(cache_key)
+        if cached is not None:
+            self._mem_cache.move_to_end(cache_key)
+            return cached
+
+        # Check the shard cache next
+        if self._cache_store is not None:
+            cached = self._cache_store.get(timestamp, realm)
+            if cached is not None:
+                self._remember(cache_key, cached)
+                return cached
+
+        # Generate legacy cache filename
         realm_suffix = f"_{realm}" if realm else ""
         filename = os.path.join(self.cache_dir, f"currency_exchange_markets{realm_suffix}_{timestamp}.json")
 
-        # Check if cached data exists
+        # Check if legacy cached data exists
         if os.path.exists(filename):
             try:
-                with open(filename, "r") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, KeyError):
+                with open(filename, "rb") as f:
+                    # mmap large files so orjson parses a contiguous view of
+                    # the kernel page cache instead of a Python-level copy;
+                    # orjson only accepts bytes-like input, hence the memoryview
+                    if orjson is not None and os.path.getsize(filename) > MMAP_THRESHOLD:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        try:
+                            cached = _json_loads(memoryview(mm))
+                        finally:
+                            mm.close()
+                    else:
+                        cached = _json_loads(f.read())
+                # Fold the legacy file into the shard so the next replay
+                # does one sequential read instead of per-file opens
+                if self._cache_store is not None:
+                    self._cache_store.put(timestamp, realm, cached)
+                self._remember(cache_key, cached)
+                return cached
+            except (OSError, ValueError, KeyError):
                 print(f"Could not read cached data for timestamp {timestamp}")
 
         # Fetch from API
@@ -88,12 +277,45 @@ class TradeAPIClient:
 
         if exchange_markets:
             # Save to cache
-            try:
-                with open(filename, "w") as f:
-                    json.dump(exchange_markets, f, indent=4)
-                print(f"Saved market data to {filename}")
-            except IOError as e:
-                print(f"Warning: Could not cache data to {filename}: {e}")
+            if self._cache_store is not None:
+                self._cache_store.put(timestamp, realm, exchange_markets)
+                print(f"Saved market data to {self._cache_store.shard_path}")
+            else:
+                try:
+                    with open(filename, "wb") as f:
+                        f.write(_json_dumps(exchange_markets))
+                    print(f"Saved market data to {filename}")
+                except IOError as e:
+                    print(f"Warning: Could not cache data to {filename}: {e}")
+            self._remember(cache_key, exchange_markets)
             return exchange_markets
 
         return None
+
+    def fetch_hourly_data_many(self, timestamps, realm=None, max_workers=8):
+        """
+        Fetch or load cached market data for several hours concurrently.
+        Cached hours return immediately; uncached hours are fetched in
+        parallel over the shared keep-alive connection pool.
+
+        Args:
+            timestamps: Iterable of unix timestamps, one per hour
+            realm: Optional realm (e.g., 'xbox', 'sony'). Defaults to PC.
+            max_workers: Maximum number of concurrent fetches
+
+        Returns:
+            List of market data dictionaries (or None for failed hours),
+            in the same order as the input timestamps
+        """
+        def fetch_with_retry(timestamp):
+            data = self.fetch_hourly_data(timestamp, realm=realm)
+            if data is None:
+                # One retry with jitter; a 429 has already waited out its
+                # Retry-After inside get_currency_exchange_markets
+                time.sleep(random.uniform(0.1, 0.5))
+                data = self.fetch_hourly_data(timestamp, realm=realm)
+            return data
+
+        timestamps = list(timestamps)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(fetch_with_retry, timestamps))
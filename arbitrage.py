@@ -1,6 +1,6 @@
-import itertools
-import statistics
 from bisect import bisect_left
+from functools import lru_cache
+import numpy as np
 from config import (
     MIN_SPREAD_THRESHOLD,
     TRIANGULAR_BASE_INVESTMENT,
@@ -8,15 +8,43 @@ from config import (
     DEFAULT_DIVINE_EXALTED_RATIO
 )
 
+# Numba compiles the triangular scoring loop to native code when installed;
+# the NumPy expression below remains the fallback.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    # No fastmath here: NaN propagation marks missing/pruned markets
+    @njit(cache=True, parallel=True)
+    def _triangular_inefficiency_kernel(price_matrix, first_leg, col_to_base):
+        currency_count = price_matrix.shape[0]
+        out = np.empty((currency_count, currency_count), dtype=np.float64)
+        for b in prange(currency_count):
+            leg = first_leg[b]
+            row = price_matrix[b]
+            for c in range(currency_count):
+                out[b, c] = leg * row[c] * col_to_base[c] - 1.0
+        return out
+else:
+    _triangular_inefficiency_kernel = None
+
+
+@lru_cache(maxsize=16)
+def _fmt_spec(precision, use_comma):
+    """Returns the number format spec for a precision, built once per combination."""
+    return f"{{:,.{precision}f}}" if use_comma else f"{{:.{precision}f}}"
+
+
 class MarketAnalyzer:
     def _format_number(self, num, precision=8, use_comma=False):
         """Formats a number to a string, removing trailing zeros, with specified precision."""
-        fmt_str = f"{{:,.{precision}f}}" if use_comma else f"{{:.{precision}f}}"
-        formatted_num = fmt_str.format(num)
-        
+        formatted_num = _fmt_spec(precision, use_comma).format(num)
+
         if '.' in formatted_num:
             formatted_num = formatted_num.rstrip('0').rstrip('.')
-        
+
         return formatted_num
 
     def __init__(self, market_data, league, realm=None, debug=False, quiet=False):
@@ -67,11 +95,30 @@ class MarketAnalyzer:
         Returns:
             Percentile rank (0-100), or 0 if volume is zero or list is empty
         """
-        if not volume_list or volume <= 0:
+        if not len(volume_list) or volume <= 0:
             return 0
         rank = bisect_left(volume_list, volume)
         return (rank / len(volume_list)) * 100
 
+    def _percentiles_batch(self, volumes, sorted_volume_arr):
+        """
+        Calculate percentile ranks for many volumes in one vectorized call.
+
+        Args:
+            volumes: Sequence of volume values to rank
+            sorted_volume_arr: Sorted float64 ndarray of reference volumes
+
+        Returns:
+            ndarray of percentile ranks (0-100); zero/negative volumes rank 0
+        """
+        volumes_arr = np.asarray(volumes, dtype=np.float64)
+        if sorted_volume_arr.size == 0:
+            return np.zeros(volumes_arr.shape)
+        ranks = np.searchsorted(sorted_volume_arr, volumes_arr, side='left')
+        percentiles = ranks * (100.0 / sorted_volume_arr.size)
+        percentiles[volumes_arr <= 0] = 0.0
+        return percentiles
+
     def _calculate_currency_stats(self, market_data_list, volume_key):
         """
         Helper method to calculate statistics for a given currency type.
@@ -88,11 +135,12 @@ class MarketAnalyzer:
             return None
 
         markets_with_volume.sort(key=lambda x: x[volume_key], reverse=True)
-        volumes = [m[volume_key] for m in markets_with_volume]
+        volumes = np.asarray([m[volume_key] for m in markets_with_volume], dtype=np.float64)
 
+        # Vectorized reductions; results stay Python floats for display code
         return {
-            'mean': statistics.mean(volumes) if volumes else 0,
-            'median': statistics.median(volumes) if volumes else 0,
+            'mean': float(volumes.mean()),
+            'median': float(np.median(volumes)),
             'top_markets': markets_with_volume
         }
 
@@ -100,37 +148,34 @@ class MarketAnalyzer:
         market_data_list = []
         self.market_base_volumes = []  # Chaos for PoE1, Exalted for PoE2
         self.market_divine_volumes = []
-        processed_pairs = set()
 
-        for currency_a, trades in self.markets.items():
-            for currency_b, data in trades.items():
-                market_pair = tuple(sorted((currency_a, currency_b)))
-                if market_pair in processed_pairs:
-                    continue
-                processed_pairs.add(market_pair)
-
-                volume_traded = data.get('volume', {})
-                base_volume = volume_traded.get(self.base_currency, 0)
-                divine_volume = volume_traded.get('divine', 0)
+        for currency_a, currency_b, data in self._pair_list:
+            volume_traded = data.get('volume', {})
+            base_volume = volume_traded.get(self.base_currency, 0)
+            divine_volume = volume_traded.get('divine', 0)
 
-                if base_volume > 0:
-                    self.market_base_volumes.append(base_volume)
+            if base_volume > 0:
+                self.market_base_volumes.append(base_volume)
 
-                if divine_volume > 0:
-                    self.market_divine_volumes.append(divine_volume)
+            if divine_volume > 0:
+                self.market_divine_volumes.append(divine_volume)
 
-                if base_volume > 0 or divine_volume > 0:
-                    market_id = f"{currency_a}|{currency_b}"
-                    market_data_list.append({
-                        'market_id': market_id,
-                        'base_volume': base_volume,
-                        'divine_volume': divine_volume,
-                        'volume_traded': volume_traded
-                    })
+            if base_volume > 0 or divine_volume > 0:
+                market_id = f"{currency_a}|{currency_b}"
+                market_data_list.append({
+                    'market_id': market_id,
+                    'base_volume': base_volume,
+                    'divine_volume': divine_volume,
+                    'volume_traded': volume_traded
+                })
 
         self.market_base_volumes.sort()
         self.market_divine_volumes.sort()
 
+        # Contiguous copies for batched percentile lookups via np.searchsorted
+        self._base_vol_arr = np.asarray(self.market_base_volumes, dtype=np.float64)
+        self._divine_vol_arr = np.asarray(self.market_divine_volumes, dtype=np.float64)
+
         # Calculate stats using helper method
         self.base_stats = self._calculate_currency_stats(market_data_list, 'base_volume')
         self.divine_stats = self._calculate_currency_stats(market_data_list, 'divine_volume')
@@ -139,11 +184,28 @@ class MarketAnalyzer:
         """
         Processes the raw market data to create a more usable structure for calculations.
         It extracts buy and sell prices for each currency pair.
+        Accepts either the full API response dict or any iterable of market
+        dicts (e.g., a streaming generator from the API client).
         """
         processed_markets = {}
         skipped_counts = {'wrong_league': 0, 'invalid_id': 0, 'missing_ratios': 0, 'zero_ratio': 0}
 
-        for market in market_data.get('markets', []):
+        if isinstance(market_data, dict):
+            market_iter = market_data.get('markets', [])
+        else:
+            market_iter = market_data
+
+        # First pass: collect valid pairs and their raw ratios. The price
+        # arithmetic is deferred so it can run as vectorized NumPy divides
+        # instead of one scalar FP op at a time in the interpreter.
+        pair_currencies = []
+        pair_volumes = []
+        low_a_list = []
+        low_b_list = []
+        high_a_list = []
+        high_b_list = []
+
+        for market in market_iter:
             if market.get('league') != self.league:
                 skipped_counts['wrong_league'] += 1
                 continue
@@ -157,45 +219,110 @@ class MarketAnalyzer:
 
             currency_a, currency_b = market_id.split('|')
 
+            # Bind the ratio dicts once instead of re-fetching them per check
+            lowest = market.get('lowest_ratio') or {}
+            highest = market.get('highest_ratio') or {}
+            low_a = lowest.get(currency_a)
+            low_b = lowest.get(currency_b)
+            high_a = highest.get(currency_a)
+            high_b = highest.get(currency_b)
+
             # Ensure we have data for both currencies in the ratios
-            if currency_a not in market.get('lowest_ratio', {}) or \
-               currency_b not in market.get('lowest_ratio', {}) or \
-               currency_a not in market.get('highest_ratio', {}) or \
-               currency_b not in market.get('highest_ratio', {}):
+            if low_a is None or low_b is None or high_a is None or high_b is None:
                 if self.debug:
                     print(f"Skipping {market_id}: missing ratio data")
                 skipped_counts['missing_ratios'] += 1
                 continue
 
             # Avoid division by zero
-            if market['lowest_ratio'][currency_a] == 0 or market['highest_ratio'][currency_a] == 0:
+            if low_a == 0 or high_a == 0:
                 if self.debug:
                     print(f"Skipping {market_id}: zero ratio value")
                 skipped_counts['zero_ratio'] += 1
                 continue
 
+            pair_currencies.append((currency_a, currency_b))
+            pair_volumes.append(market.get('volume_traded') or {})
+            low_a_list.append(low_a)
+            low_b_list.append(low_b)
+            high_a_list.append(high_a)
+            high_b_list.append(high_b)
+
+        if pair_currencies:
+            low_a_arr = np.asarray(low_a_list, dtype=np.float64)
+            low_b_arr = np.asarray(low_b_list, dtype=np.float64)
+            high_a_arr = np.asarray(high_a_list, dtype=np.float64)
+            high_b_arr = np.asarray(high_b_list, dtype=np.float64)
+
             # lowest_ratio: The lowest exchange rate at which trades executed during this hour
             # When converting to price: this gives us the MAXIMUM value (better for selling)
             # Ratio is A:B, so the price in B is B/A.
-            max_historical_price_for_a = market['lowest_ratio'][currency_b] / market['lowest_ratio'][currency_a]
+            max_prices = low_b_arr / low_a_arr
 
             # highest_ratio: The highest exchange rate at which trades executed during this hour
             # When converting to price: this gives us the MINIMUM value (worse for selling, better for buying)
             # Ratio is A:B, so the price in B is B/A.
-            min_historical_price_for_a = market['highest_ratio'][currency_b] / market['highest_ratio'][currency_a]
-
-            volume_traded = market.get('volume_traded', {})
-
-            if currency_a not in processed_markets:
-                processed_markets[currency_a] = {}
-            if currency_b not in processed_markets:
-                processed_markets[currency_b] = {}
-
-            # Store from the perspective of trading currency_a
-            # 'max_price' = highest historical price, 'min_price' = lowest historical price
-            processed_markets[currency_a][currency_b] = {'max_price': max_historical_price_for_a, 'min_price': min_historical_price_for_a, 'volume': volume_traded}
-            # Store the inverse perspective for triangular path analysis
-            processed_markets[currency_b][currency_a] = {'max_price': 1 / min_historical_price_for_a, 'min_price': 1 / max_historical_price_for_a, 'volume': volume_traded}
+            min_prices = high_b_arr / high_a_arr
+
+            # Inverse perspective prices, computed as packed vector divides
+            inverse_max_prices = (1.0 / min_prices).tolist()
+            inverse_min_prices = (1.0 / max_prices).tolist()
+            max_prices = max_prices.tolist()
+            min_prices = min_prices.tolist()
+
+            # Second pass: populate the dict-of-dicts structure unchanged
+            # for downstream compatibility
+            processed_markets_setdefault = processed_markets.setdefault
+            for i, (currency_a, currency_b) in enumerate(pair_currencies):
+                volume_traded = pair_volumes[i]
+                # Store from the perspective of trading currency_a
+                # 'max_price' = highest historical price, 'min_price' = lowest historical price
+                processed_markets_setdefault(currency_a, {})[currency_b] = {'max_price': max_prices[i], 'min_price': min_prices[i], 'volume': volume_traded}
+                # Store the inverse perspective for triangular path analysis
+                processed_markets_setdefault(currency_b, {})[currency_a] = {'max_price': inverse_max_prices[i], 'min_price': inverse_min_prices[i], 'volume': volume_traded}
+
+        # Canonical a < b pair list so downstream scans visit each market
+        # exactly once without rebuilding a dedup set of sorted tuples
+        self._pair_list = [
+            (currency_a, currency_b, data)
+            for currency_a in sorted(processed_markets)
+            for currency_b, data in sorted(processed_markets[currency_a].items())
+            if currency_a < currency_b
+        ]
+
+        # Struct-of-arrays view of the canonical pairs: contiguous float64
+        # columns the analytics passes can scan without per-edge dict chasing
+        edge_a = []
+        edge_b = []
+        edge_min = []
+        edge_max = []
+        edge_base_vol = []
+        edge_divine_vol = []
+        for currency_a, currency_b, data in self._pair_list:
+            volume_traded = data.get('volume', {})
+            edge_a.append(currency_a)
+            edge_b.append(currency_b)
+            edge_min.append(data['min_price'])
+            edge_max.append(data['max_price'])
+            edge_base_vol.append(volume_traded.get(self.base_currency, 0))
+            edge_divine_vol.append(volume_traded.get('divine', 0))
+        self.edge_a = edge_a
+        self.edge_b = edge_b
+        self.edge_min_price = np.asarray(edge_min, dtype=np.float64)
+        self.edge_max_price = np.asarray(edge_max, dtype=np.float64)
+        self.edge_base_vol = np.asarray(edge_base_vol, dtype=np.float64)
+        self.edge_divine_vol = np.asarray(edge_divine_vol, dtype=np.float64)
+
+        # Dense min-price matrix for triangular path analysis: P[i, j] is the
+        # lowest historical price of currency i in currency j (NaN = no market)
+        self.currency_list = list(processed_markets)
+        self.currency_index = {c: i for i, c in enumerate(self.currency_list)}
+        currency_count = len(self.currency_list)
+        self.min_price_matrix = np.full((currency_count, currency_count), np.nan, dtype=np.float64)
+        for currency_a, trades in processed_markets.items():
+            row = self.min_price_matrix[self.currency_index[currency_a]]
+            for currency_b, data in trades.items():
+                row[self.currency_index[currency_b]] = data['min_price']
 
         if self.debug:
             print(f"\nMarket Processing Summary:")
@@ -217,90 +344,86 @@ class MarketAnalyzer:
         print("HISTORICAL PRICE SPREAD ANALYSIS (Single Hour)")
         print("Markets with widest volatility in the analyzed hour")
         print(f"{'='*80}")
-        opportunities = []
-        processed_pairs = set()
-        for currency_a, trades in self.markets.items():
-            for currency_b, prices in trades.items():
-                market_pair = tuple(sorted((currency_a, currency_b)))
-                if market_pair in processed_pairs:
-                    continue
-                
-                processed_pairs.add(market_pair)
-
-                # Calculate spread width: difference between historical high and low prices
-                # A wide spread indicates high volatility in this market during the hour
-                # prices['max_price'] is the highest price traded for currency_a in currency_b
-                # prices['min_price'] is the lowest price traded for currency_a in currency_b
-                # Spread = how much higher the max was compared to the min
-                if prices['min_price'] > 0: # Avoid division by zero
-                    spread_width = (prices['max_price'] / prices['min_price']) - 1
-                    if spread_width > MIN_SPREAD_THRESHOLD:
-                        market_pair = f"{currency_a} <-> {currency_b}"
-
-                        # Calculate potential value in base currency if this spread persists
-                        base_value_str = ""
-                        try:
-                            # Estimate value based on TRIANGULAR_BASE_INVESTMENT units traded at this spread width
-                            if currency_b == self.base_currency:
-                                potential_value = TRIANGULAR_BASE_INVESTMENT * spread_width
-                                base_value_str = f" (Historical spread: {potential_value:.2f} {self.base_currency.capitalize()} on {TRIANGULAR_BASE_INVESTMENT} {self.base_currency.capitalize()} volume)"
-                            # If we can relate currency_b to base currency, estimate the value
-                            elif self.base_currency in self.markets[currency_b]:
-                                price_b_in_base = self.markets[currency_b][self.base_currency]['min_price']
-                                potential_value = TRIANGULAR_BASE_INVESTMENT * price_b_in_base * spread_width
-                                base_value_str = f" (Historical spread: ~{potential_value:.2f} {self.base_currency.capitalize()} on {TRIANGULAR_BASE_INVESTMENT} {currency_b} volume)"
-                        except (KeyError, ZeroDivisionError):
-                            pass # Can't calculate base value, so we skip it.
-
-                        volume_data = prices.get('volume', {})
-                        base_volume = volume_data.get(self.base_currency, 0)
-                        divine_volume = volume_data.get('divine', 0)
-
-                        if hide_zero_volume and base_volume == 0 and divine_volume == 0:
-                            continue
-
-                        # Calculate percentiles for both currencies using helper method
-                        base_percentile = self._get_volume_percentile(base_volume, self.market_base_volumes)
-                        divine_percentile = self._get_volume_percentile(divine_volume, self.market_divine_volumes)
-
-                        # Use the higher percentile as the overall liquidity indicator
-                        volume_percentile = max(base_percentile, divine_percentile)
-
-                        opportunities.append((spread_width, market_pair, prices['min_price'], prices['max_price'], base_value_str, volume_percentile, base_volume, divine_volume))
-
-        opportunities.sort(key=lambda x: x[0], reverse=True)
-
-        if not opportunities:
+        # Branchless spread over the whole edge table: the fmax guard keeps
+        # the divide well-defined, the min_price > 0 mask drops those rows.
+        # Spread = how much higher the historical max price was than the min.
+        min_p = self.edge_min_price
+        max_p = self.edge_max_price
+        spread = max_p / np.fmax(min_p, np.finfo(np.float64).tiny) - 1.0
+        valid = (min_p > 0) & (spread > MIN_SPREAD_THRESHOLD)
+        if hide_zero_volume:
+            valid &= (self.edge_base_vol > 0) | (self.edge_divine_vol > 0)
+
+        candidate_idx = np.where(valid)[0]
+        if candidate_idx.size == 0:
             print("\nNo markets found with spreads meeting criteria.")
             return []
 
-        # Convert to dict format for easier access
+        # Partial selection via argpartition, then exact-sort only the top N
+        candidate_spreads = spread[candidate_idx]
+        if candidate_idx.size > top_n:
+            keep = np.argpartition(candidate_spreads, -top_n)[-top_n:]
+        else:
+            keep = np.arange(candidate_idx.size)
+        keep = keep[np.argsort(candidate_spreads[keep])[::-1]]
+        top_idx = candidate_idx[keep]
+
+        # Liquidity percentiles, batched for just the surviving rows;
+        # use the higher percentile as the overall liquidity indicator
+        base_percentiles = self._percentiles_batch(self.edge_base_vol[top_idx], self._base_vol_arr)
+        divine_percentiles = self._percentiles_batch(self.edge_divine_vol[top_idx], self._divine_vol_arr)
+        volume_percentiles = np.maximum(base_percentiles, divine_percentiles)
+
+        # Display strings are only built for the top N survivors
         formatted_opportunities = []
-        for i, (spread, pair, min_price, max_price, base_value, percentile, base_vol, divine_vol) in enumerate(opportunities[:top_n]):
+        for i, edge_idx in enumerate(top_idx):
+            currency_a = self.edge_a[edge_idx]
+            currency_b = self.edge_b[edge_idx]
+            prices = self.markets[currency_a][currency_b]
+            spread_width = float(spread[edge_idx])
+            percentile = float(volume_percentiles[i])
+
+            volume_data = prices.get('volume', {})
+            base_volume = volume_data.get(self.base_currency, 0)
+            divine_volume = volume_data.get('divine', 0)
+
+            # Calculate potential value in base currency if this spread persists
+            base_value_str = ""
+            try:
+                # Estimate value based on TRIANGULAR_BASE_INVESTMENT units traded at this spread width
+                if currency_b == self.base_currency:
+                    potential_value = TRIANGULAR_BASE_INVESTMENT * spread_width
+                    base_value_str = f" (Historical spread: {potential_value:.2f} {self.base_currency_display} on {TRIANGULAR_BASE_INVESTMENT} {self.base_currency_display} volume)"
+                # If we can relate currency_b to base currency, estimate the value
+                elif self.base_currency in self.markets[currency_b]:
+                    price_b_in_base = self.markets[currency_b][self.base_currency]['min_price']
+                    potential_value = TRIANGULAR_BASE_INVESTMENT * price_b_in_base * spread_width
+                    base_value_str = f" (Historical spread: ~{potential_value:.2f} {self.base_currency_display} on {TRIANGULAR_BASE_INVESTMENT} {currency_b} volume)"
+            except (KeyError, ZeroDivisionError):
+                pass # Can't calculate base value, so we skip it.
+
             formatted_opportunities.append({
-                'pair': pair,
-                'spread': spread,
-                'min_price': min_price,
-                'max_price': max_price,
+                'pair': f"{currency_a} <-> {currency_b}",
+                'spread': spread_width,
+                'min_price': prices['min_price'],
+                'max_price': prices['max_price'],
                 'percentile': percentile,
-                'base_volume': base_vol,
-                'divine_volume': divine_vol
+                'base_volume': base_volume,
+                'divine_volume': divine_volume
             })
 
-        for i, (spread, pair, min_price, max_price, base_value, percentile, base_vol, divine_vol) in enumerate(opportunities[:top_n]):
-            currencies = pair.split(' <-> ')
-            print(f"\n{i+1}. {currencies[0].upper()} <-> {currencies[1].upper()}")
-            print(f"   Spread Width: {spread:.2%}")
-            print(f"   Price Range: {self._format_number(min_price)} to {self._format_number(max_price)}")
-            if base_value:
-                print(f"   {base_value.strip()}")
+            print(f"\n{i+1}. {currency_a.upper()} <-> {currency_b.upper()}")
+            print(f"   Spread Width: {spread_width:.2%}")
+            print(f"   Price Range: {self._format_number(prices['min_price'])} to {self._format_number(prices['max_price'])}")
+            if base_value_str:
+                print(f"   {base_value_str.strip()}")
             print(f"   Liquidity: {percentile:.0f}th percentile")
-            if base_vol > 0 or divine_vol > 0:
+            if base_volume > 0 or divine_volume > 0:
                 volume_parts = []
-                if base_vol > 0:
-                    volume_parts.append(f"{base_vol:,} {self.base_currency.capitalize()}")
-                if divine_vol > 0:
-                    volume_parts.append(f"{divine_vol:,} Divine")
+                if base_volume > 0:
+                    volume_parts.append(f"{base_volume:,} {self.base_currency_display}")
+                if divine_volume > 0:
+                    volume_parts.append(f"{divine_volume:,} Divine")
                 print(f"   Volume: {' | '.join(volume_parts)}")
 
         return formatted_opportunities
@@ -325,116 +448,136 @@ class MarketAnalyzer:
             print(f"Filtering: All legs must have >{min_percentile}th percentile volume")
         print(f"{'='*80}")
         opportunities = []
-        currencies = list(self.markets.keys())
-        
-        # Iterate through all unique combinations of 3 currencies
-        # Only start from base currency to eliminate duplicate cycles
-        # (base->divine->X and divine->X->base would be the same cycle)
-        for curr_a, curr_b, curr_c in itertools.permutations(currencies, 3):
-            # Filter: only analyze paths starting from base currency
-            if curr_a != self.base_currency:
-                continue
-
-            try:
-                # Path: A -> B -> C -> A
-                # Using minimum historical prices (most favorable path for analysis)
-                # Start with 1 unit of curr_a
+        base_idx = self.currency_index.get(self.base_currency)
+
+        if base_idx is not None and len(self.currency_list) >= 3:
+            currencies = self.currency_list
+            currency_count = len(currencies)
+            price_matrix = self.min_price_matrix
+
+            # Branch-and-bound prune: the best product through first leg b is
+            # bounded by P[base,b] * max(P[b,:]) * max(P[:,base]); first legs
+            # whose bound can't reach break-even are dropped before the full
+            # product. -inf stands in for missing markets so empty rows prune.
+            finite_prices = np.where(np.isfinite(price_matrix), price_matrix, -np.inf)
+            max_out = finite_prices.max(axis=1)
+            max_in_to_base = finite_prices[:, base_idx].max()
+            first_leg = price_matrix[base_idx].copy()
+            upper_bound = first_leg * max_out * max_in_to_base
+            first_leg[~(upper_bound > 1.0)] = np.nan
+
+            # Path product for base -> b -> c -> base for every surviving
+            # (b, c) at once: one vectorized outer product instead of C^2
+            # interpreter iterations. NaNs propagate through the product.
+            col_to_base = np.ascontiguousarray(price_matrix[:, base_idx])
+            if _triangular_inefficiency_kernel is not None:
+                inefficiency = _triangular_inefficiency_kernel(price_matrix, first_leg, col_to_base)
+            else:
+                with np.errstate(invalid='ignore'):
+                    inefficiency = (first_leg[:, None]
+                                    * price_matrix
+                                    * col_to_base[None, :]) - 1.0
+
+            # Mask degenerate paths: self-edges and legs through the base currency
+            inefficiency[base_idx, :] = np.nan
+            inefficiency[:, base_idx] = np.nan
+            np.fill_diagonal(inefficiency, np.nan)
+
+            flat = inefficiency.ravel()
+            candidate_idx = np.where(np.isfinite(flat) & (flat > 0))[0]
+            # Walk candidates best-first; the volume filters below only remove
+            # entries, so we can stop once top_n survivors are collected
+            candidate_idx = candidate_idx[np.argsort(flat[candidate_idx])[::-1]]
+
+            curr_a = self.base_currency
+            for idx in candidate_idx:
+                if len(opportunities) >= top_n:
+                    break
+
+                b_idx, c_idx = divmod(int(idx), currency_count)
+                curr_b = currencies[b_idx]
+                curr_c = currencies[c_idx]
+                inefficiency_ratio = float(flat[idx])
+
+                # Path: A -> B -> C -> A using minimum historical prices
                 price_ab = self.markets[curr_a][curr_b]['min_price']
                 price_bc = self.markets[curr_b][curr_c]['min_price']
                 price_ca = self.markets[curr_c][curr_a]['min_price']
+                final_amount_a = 1 + inefficiency_ratio
 
-                # 1. Trade A for B at historical min price
-                amount_b = 1 * price_ab
-                # 2. Trade B for C at historical min price
-                amount_c = amount_b * price_bc
-                # 3. Trade C for A at historical min price
-                final_amount_a = amount_c * price_ca
-
-                inefficiency_ratio = final_amount_a - 1
-
-                if inefficiency_ratio > 0:
-                    # Get volumes for both base currency and Divine
-                    base_volume_ab = self.markets[curr_a][curr_b].get('volume', {}).get(self.base_currency, 0)
-                    base_volume_bc = self.markets[curr_b][curr_c].get('volume', {}).get(self.base_currency, 0)
-                    base_volume_ca = self.markets[curr_c][curr_a].get('volume', {}).get(self.base_currency, 0)
-
-                    divine_volume_ab = self.markets[curr_a][curr_b].get('volume', {}).get('divine', 0)
-                    divine_volume_bc = self.markets[curr_b][curr_c].get('volume', {}).get('divine', 0)
-                    divine_volume_ca = self.markets[curr_c][curr_a].get('volume', {}).get('divine', 0)
-
-                    # Check if all legs have at least one of the currencies traded
-                    has_volume_ab = base_volume_ab > 0 or divine_volume_ab > 0
-                    has_volume_bc = base_volume_bc > 0 or divine_volume_bc > 0
-                    has_volume_ca = base_volume_ca > 0 or divine_volume_ca > 0
-
-                    if hide_zero_volume and not (has_volume_ab and has_volume_bc and has_volume_ca):
-                        continue
-
-                    # Calculate percentiles for each leg using helper method
-                    base_p_ab = self._get_volume_percentile(base_volume_ab, self.market_base_volumes)
-                    divine_p_ab = self._get_volume_percentile(divine_volume_ab, self.market_divine_volumes)
-                    percentile_ab = max(base_p_ab, divine_p_ab)
-
-                    base_p_bc = self._get_volume_percentile(base_volume_bc, self.market_base_volumes)
-                    divine_p_bc = self._get_volume_percentile(divine_volume_bc, self.market_divine_volumes)
-                    percentile_bc = max(base_p_bc, divine_p_bc)
-
-                    base_p_ca = self._get_volume_percentile(base_volume_ca, self.market_base_volumes)
-                    divine_p_ca = self._get_volume_percentile(divine_volume_ca, self.market_divine_volumes)
-                    percentile_ca = max(base_p_ca, divine_p_ca)
-
-                    lowest_leg_percentile = min(percentile_ab, percentile_bc, percentile_ca)
-
-                    # Filter out paths where the minimum leg percentile is too low (illiquid)
-                    if lowest_leg_percentile < min_percentile:
-                        continue
-
-                    # Calculate historical inefficiency value in base currency if possible
-                    base_value_str = ""
-                    if curr_a == self.base_currency:
-                        historical_value = TRIANGULAR_BASE_INVESTMENT * inefficiency_ratio
-                        base_value_str = f" (Historical inefficiency: {historical_value:.2f} {self.base_currency.capitalize()} per {TRIANGULAR_BASE_INVESTMENT} invested)"
-
-                    steps_str = f"Historical Rates: {self._format_number(price_ab)}, {self._format_number(price_bc)}, {self._format_number(price_ca)}"
-
-                    # Calculate total volumes across all legs (take max for each currency)
-                    total_base_vol = max(base_volume_ab, base_volume_bc, base_volume_ca)
-                    total_divine_vol = max(divine_volume_ab, divine_volume_bc, divine_volume_ca)
-
-                    opportunities.append({
-                        'inefficiency': inefficiency_ratio,
-                        'path': f"{curr_a} -> {curr_b} -> {curr_c} -> {curr_a}",
-                        'base_value': base_value_str,
-                        'steps': steps_str,
-                        'volume_percentile': lowest_leg_percentile,
-                        'base_volume': total_base_vol,
-                        'divine_volume': total_divine_vol,
-                        # Store individual step data for detailed display
-                        'curr_a': curr_a,
-                        'curr_b': curr_b,
-                        'curr_c': curr_c,
-                        'amount_a_start': TRIANGULAR_BASE_INVESTMENT,
-                        'amount_b': TRIANGULAR_BASE_INVESTMENT * price_ab,
-                        'amount_c': TRIANGULAR_BASE_INVESTMENT * price_ab * price_bc,
-                        'amount_a_end': TRIANGULAR_BASE_INVESTMENT * final_amount_a,
-                        'price_ab': price_ab,
-                        'price_bc': price_bc,
-                        'price_ca': price_ca
-                    })
-
-            except KeyError:
-                # This path is not possible if a market between any pair doesn't exist
-                continue
+                # Get volumes for both base currency and Divine
+                base_volume_ab = self.markets[curr_a][curr_b].get('volume', {}).get(self.base_currency, 0)
+                base_volume_bc = self.markets[curr_b][curr_c].get('volume', {}).get(self.base_currency, 0)
+                base_volume_ca = self.markets[curr_c][curr_a].get('volume', {}).get(self.base_currency, 0)
+
+                divine_volume_ab = self.markets[curr_a][curr_b].get('volume', {}).get('divine', 0)
+                divine_volume_bc = self.markets[curr_b][curr_c].get('volume', {}).get('divine', 0)
+                divine_volume_ca = self.markets[curr_c][curr_a].get('volume', {}).get('divine', 0)
+
+                # Check if all legs have at least one of the currencies traded
+                has_volume_ab = base_volume_ab > 0 or divine_volume_ab > 0
+                has_volume_bc = base_volume_bc > 0 or divine_volume_bc > 0
+                has_volume_ca = base_volume_ca > 0 or divine_volume_ca > 0
+
+                if hide_zero_volume and not (has_volume_ab and has_volume_bc and has_volume_ca):
+                    continue
+
+                # Calculate percentiles for each leg using helper method
+                base_p_ab = self._get_volume_percentile(base_volume_ab, self.market_base_volumes)
+                divine_p_ab = self._get_volume_percentile(divine_volume_ab, self.market_divine_volumes)
+                percentile_ab = max(base_p_ab, divine_p_ab)
+
+                base_p_bc = self._get_volume_percentile(base_volume_bc, self.market_base_volumes)
+                divine_p_bc = self._get_volume_percentile(divine_volume_bc, self.market_divine_volumes)
+                percentile_bc = max(base_p_bc, divine_p_bc)
+
+                base_p_ca = self._get_volume_percentile(base_volume_ca, self.market_base_volumes)
+                divine_p_ca = self._get_volume_percentile(divine_volume_ca, self.market_divine_volumes)
+                percentile_ca = max(base_p_ca, divine_p_ca)
+
+                lowest_leg_percentile = min(percentile_ab, percentile_bc, percentile_ca)
+
+                # Filter out paths where the minimum leg percentile is too low (illiquid)
+                if lowest_leg_percentile < min_percentile:
+                    continue
 
-        # Sort by inefficiency ratio and get the top N
-        opportunities.sort(key=lambda x: x['inefficiency'], reverse=True)
+                # Calculate historical inefficiency value in base currency if possible
+                historical_value = TRIANGULAR_BASE_INVESTMENT * inefficiency_ratio
+                base_value_str = f" (Historical inefficiency: {historical_value:.2f} {self.base_currency_display} per {TRIANGULAR_BASE_INVESTMENT} invested)"
+
+                steps_str = f"Historical Rates: {self._format_number(price_ab)}, {self._format_number(price_bc)}, {self._format_number(price_ca)}"
+
+                # Calculate total volumes across all legs (take max for each currency)
+                total_base_vol = max(base_volume_ab, base_volume_bc, base_volume_ca)
+                total_divine_vol = max(divine_volume_ab, divine_volume_bc, divine_volume_ca)
+
+                opportunities.append({
+                    'inefficiency': inefficiency_ratio,
+                    'path': f"{curr_a} -> {curr_b} -> {curr_c} -> {curr_a}",
+                    'base_value': base_value_str,
+                    'steps': steps_str,
+                    'volume_percentile': lowest_leg_percentile,
+                    'base_volume': total_base_vol,
+                    'divine_volume': total_divine_vol,
+                    # Store individual step data for detailed display
+                    'curr_a': curr_a,
+                    'curr_b': curr_b,
+                    'curr_c': curr_c,
+                    'amount_a_start': TRIANGULAR_BASE_INVESTMENT,
+                    'amount_b': TRIANGULAR_BASE_INVESTMENT * price_ab,
+                    'amount_c': TRIANGULAR_BASE_INVESTMENT * price_ab * price_bc,
+                    'amount_a_end': TRIANGULAR_BASE_INVESTMENT * final_amount_a,
+                    'price_ab': price_ab,
+                    'price_bc': price_bc,
+                    'price_ca': price_ca
+                })
 
         if not opportunities:
             print("\nNo triangular paths found meeting criteria.")
             return []
 
-        # Get top N for display and return
-        top_opportunities = opportunities[:top_n]
+        # Candidates were visited best-first, so this is already the top N
+        top_opportunities = opportunities
 
         for i, opp in enumerate(top_opportunities):
             print(f"\n{i+1}. Path: {opp['path']}")
@@ -461,7 +604,7 @@ class MarketAnalyzer:
             if opp['base_volume'] > 0 or opp['divine_volume'] > 0:
                 volume_parts = []
                 if opp['base_volume'] > 0:
-                    volume_parts.append(f"{opp['base_volume']:,} {self.base_currency.capitalize()}")
+                    volume_parts.append(f"{opp['base_volume']:,} {self.base_currency_display}")
                 if opp['divine_volume'] > 0:
                     volume_parts.append(f"{opp['divine_volume']:,} Divine")
                 print(f"   Max Volume per Leg: {' | '.join(volume_parts)}")
@@ -483,17 +626,17 @@ class MarketAnalyzer:
 
         # --- Base Currency Stats ---
         if self.base_stats:
-            print(f"\n{self.base_currency.capitalize()} Orb Volume Statistics:")
-            print(f"   Mean: {self._format_number(self.base_stats['mean'], precision=2, use_comma=True)} {self.base_currency.capitalize()}")
-            print(f"   Median: {self._format_number(self.base_stats['median'], precision=2, use_comma=True)} {self.base_currency.capitalize()}")
+            print(f"\n{self.base_currency_display} Orb Volume Statistics:")
+            print(f"   Mean: {self._format_number(self.base_stats['mean'], precision=2, use_comma=True)} {self.base_currency_display}")
+            print(f"   Median: {self._format_number(self.base_stats['median'], precision=2, use_comma=True)} {self.base_currency_display}")
 
-            print(f"\nTop {top_n} Markets by {self.base_currency.capitalize()} Volume:")
+            print(f"\nTop {top_n} Markets by {self.base_currency_display} Volume:")
             for i, market in enumerate(self.base_stats['top_markets'][:top_n]):
                 currencies = market['market_id'].split('|')
                 other_currency = next((c for c in currencies if c != self.base_currency), None)
 
                 print(f"\n{i+1}. {currencies[0].upper()} <-> {currencies[1].upper()}")
-                print(f"   {self.base_currency.capitalize()} Volume: {market['base_volume']:,}")
+                print(f"   {self.base_currency_display} Volume: {market['base_volume']:,}")
                 if other_currency and other_currency in market['volume_traded']:
                     other_volume = market['volume_traded'][other_currency]
                     print(f"   {other_currency.replace('-', ' ').title()} Volume: {other_volume:,}")
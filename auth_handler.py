@@ -32,6 +32,12 @@ def get_access_token_client_credentials():
         with open("token.json", "w") as f:
             json.dump(token, f)
         print("Token saved to token.json")
+
+        # Invalidate the client's memoized token read so a live process
+        # picks up the fresh token (imported here to avoid a cycle)
+        from api_client import _read_token_file
+        _read_token_file.cache_clear()
+
         return token
     except requests.exceptions.RequestException as e:
         print(f"An error occurred: {e}")
@@ -4,8 +4,17 @@ from trend_analyzer import TrendAnalyzer
 from discord_notifier import DiscordNotifier
 import config
 import json
+import mmap
+import threading
 import time
 
+# orjson parses the large sample file several times faster than stdlib json;
+# fall back to stdlib if it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load configuration from config.py
 # You can override these values here if needed for testing
 hours_back = config.HOURS_BACK
@@ -37,8 +46,15 @@ def main():
         print(f"Error initializing client: {e}")
         return
 
-    # Calculate timestamps
-    current_hour = int(time.time() // 3600 * 3600)
+    # Warm pooled TLS connections in the background so the first API call
+    # and webhook post don't pay handshake latency on the critical path
+    threading.Thread(target=client.prewarm, daemon=True).start()
+    if discord.enabled:
+        threading.Thread(target=discord.prewarm, daemon=True).start()
+
+    # Calculate timestamps (pure integer math — no float rounding at
+    # second boundaries)
+    current_hour = (time.time_ns() // 3_600_000_000_000) * 3600
     target_timestamp = current_hour - (hours_back * 3600)
 
     # === SINGLE HOUR ANALYSIS (Current/Latest Hour) ===
@@ -48,10 +64,28 @@ def main():
 
     current_markets = None
 
+    # Embeds from every section are coalesced into one webhook POST at the
+    # end of the run (Discord allows up to 10 embeds per message)
+    report_embeds = []
+
     if testing:
         # Load from sample file if testing
-        with open("data_exports/currency_example.json", "r") as f:
-            current_markets = json.load(f)
+        with open("data_exports/currency_example.json", "rb") as f:
+            if orjson is not None:
+                # mmap lets orjson parse straight from the kernel page cache,
+                # so repeated testing runs skip the read copy entirely.
+                # orjson only accepts bytes-like input, hence the memoryview
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        current_markets = orjson.loads(memoryview(mm))
+                    finally:
+                        mm.close()
+                except (OSError, orjson.JSONDecodeError):
+                    f.seek(0)
+                    current_markets = orjson.loads(f.read())
+            else:
+                current_markets = json.loads(f.read())
         print("Loaded sample currency exchange markets for testing.")
     else:
         # Fetch current hour data using API client's caching method
@@ -81,12 +115,12 @@ def main():
                 min_percentile=config.SINGLE_HOUR_TRIANGULAR_MIN_PERCENTILE
             )
 
-            # Send Discord notifications for single-hour analysis
-            if config.DISCORD_SEND_SPREAD_OPPORTUNITIES and spread_opps:
-                discord.send_spread_opportunities(spread_opps, league, current_analyzer.base_currency, top_n=config.SINGLE_HOUR_TOP_N)
+            # Build Discord embeds for single-hour analysis
+            if config.DISCORD_SEND_SPREAD_OPPORTUNITIES and discord.enabled and spread_opps:
+                report_embeds.append(discord._build_spread_embed(spread_opps, league, current_analyzer.base_currency, top_n=config.SINGLE_HOUR_TOP_N))
 
-            if config.DISCORD_SEND_TRIANGULAR_TRADES and triangular_opps:
-                discord.send_triangular_trades(triangular_opps, league, current_analyzer.base_currency, top_n=config.SINGLE_HOUR_TOP_N)
+            if config.DISCORD_SEND_TRIANGULAR_TRADES and discord.enabled and triangular_opps:
+                report_embeds.append(discord._build_triangular_embed(triangular_opps, league, current_analyzer.base_currency, top_n=config.SINGLE_HOUR_TOP_N))
 
         except Exception as e:
             print(f"Error analyzing current market data: {e}")
@@ -101,20 +135,17 @@ def main():
         print(f"{'='*80}")
 
         try:
-            # Fetch data for multiple hours
-            hourly_data_list = []
-            timestamps = []
-
+            # Fetch data for multiple hours concurrently (cached hours return
+            # immediately; only uncached hours hit the API in parallel)
             print(f"\nFetching {trend_hours} hours of historical data...")
-            for i in range(trend_hours, 0, -1):
-                ts = target_timestamp - (i * 3600)
-                timestamps.append(ts)
+            timestamps = [target_timestamp - (i * 3600) for i in range(trend_hours, 0, -1)]
+            results = client.fetch_hourly_data_many(timestamps, realm=realm)
 
-                data = client.fetch_hourly_data(ts, realm=realm)
-                if data:
-                    hourly_data_list.append(data)
-                else:
-                    print(f"Warning: Could not fetch data for hour {i} hours ago (timestamp: {ts})")
+            hourly_data_list = [data for data in results if data]
+            if len(hourly_data_list) != len(timestamps):
+                for ts, data in zip(timestamps, results):
+                    if not data:
+                        print(f"Warning: Could not fetch data for timestamp {ts}")
 
             # Add current hour to the end
             hourly_data_list.append(current_markets)
@@ -161,12 +192,12 @@ def main():
                     top_n=config.CURRENT_VS_HISTORICAL_TOP_N
                 )
 
-                # Send Discord notifications for trend analysis
-                if config.DISCORD_SEND_PERSISTENT_MARKETS and persistent_markets:
-                    discord.send_persistent_markets(persistent_markets, league, trend_analyzer.base_currency, trend_hours, top_n=config.PERSISTENT_TOP_N)
+                # Build Discord embeds for trend analysis
+                if config.DISCORD_SEND_PERSISTENT_MARKETS and discord.enabled and persistent_markets:
+                    report_embeds.append(discord._build_persistent_embed(persistent_markets, league, trend_analyzer.base_currency, trend_hours, top_n=config.PERSISTENT_TOP_N))
 
-                if config.DISCORD_SEND_TRENDING_MARKETS and trending_markets:
-                    discord.send_trending_markets(trending_markets, league, trend_analyzer.base_currency, config.TRENDING_LOOKBACK_HOURS, top_n=config.TRENDING_TOP_N)
+                if config.DISCORD_SEND_TRENDING_MARKETS and discord.enabled and trending_markets:
+                    report_embeds.append(discord._build_trending_embed(trending_markets, league, trend_analyzer.base_currency, config.TRENDING_LOOKBACK_HOURS, top_n=config.TRENDING_TOP_N))
 
             else:
                 print(f"\nInsufficient data for trend analysis (need at least 2 hours, got {len(hourly_data_list)})")
@@ -178,6 +209,13 @@ def main():
     elif enable_trend_analysis and testing:
         print("\nNote: Trend analysis is disabled in testing mode (only one sample file available)")
 
+    # Send every section in a single webhook POST, then wait for the
+    # background worker to drain before exiting
+    embeds = [e for e in report_embeds if e]
+    if embeds:
+        discord.send_message(embeds=embeds)
+    discord.flush()
+
     print(f"\n{'='*80}")
     print("Analysis complete!")
     print(f"{'='*80}")
@@ -3,8 +3,9 @@ Multi-hour trend analysis for Path of Exile currency markets.
 Analyzes patterns across multiple hours to identify persistent volatility.
 """
 
-import statistics
-from collections import defaultdict
+import sys
+
+import numpy as np
 from arbitrage import MarketAnalyzer
 from config import (
     DEFAULT_DIVINE_CHAOS_RATIO,
@@ -13,6 +14,48 @@ from config import (
     VOLUME_TREND_DOWN_MULTIPLIER
 )
 
+# Numba fuses the per-market column scans into one compiled pass over the
+# matrices; the NumPy expressions in the getters remain the fallback.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _market_columns_kernel(S, B, D, min_spread):
+        """
+        Fused per-market scan over the (markets, hours) matrices.
+        Returns traded-hour counts, hours at/above min_spread, and the
+        sum/count of positive base and divine volumes per market.
+        NaN marks hours without trades; NaN != NaN skips them.
+        """
+        n_markets, n_hours = S.shape
+        total_hours = np.zeros(n_markets, dtype=np.int64)
+        hours_with_spread = np.zeros(n_markets, dtype=np.int64)
+        base_sum = np.zeros(n_markets)
+        base_count = np.zeros(n_markets, dtype=np.int64)
+        divine_sum = np.zeros(n_markets)
+        divine_count = np.zeros(n_markets, dtype=np.int64)
+        for i in prange(n_markets):
+            for j in range(n_hours):
+                s = S[i, j]
+                if s == s:
+                    total_hours[i] += 1
+                    if s >= min_spread:
+                        hours_with_spread[i] += 1
+                b = B[i, j]
+                if b > 0:
+                    base_sum[i] += b
+                    base_count[i] += 1
+                d = D[i, j]
+                if d > 0:
+                    divine_sum[i] += d
+                    divine_count[i] += 1
+        return total_hours, hours_with_spread, base_sum, base_count, divine_sum, divine_count
+else:
+    _market_columns_kernel = None
+
 
 class TrendAnalyzer:
     """
@@ -42,13 +85,39 @@ class TrendAnalyzer:
             for data in hourly_data_list
         ]
 
-        # Track patterns across hours in a unified structure
-        self.market_history = defaultdict(lambda: {
-            'spreads': [],
-            'base_volumes': [],
-            'divine_volumes': []
-        })
-        self.triangular_history = defaultdict(list)
+        # Trend history as struct-of-arrays: one (markets, hours) float64
+        # matrix per metric, NaN marking hours where a market had no trades.
+        # Rows are addressed via self._mid_index[market_id]; built by
+        # _analyze_trends so the getters run on C-level NumPy reductions
+        # instead of rescanning per-hour dict records.
+        self.triangular_history = {}
+
+        # Lazily-built per-market summary cache. The hourly data never
+        # changes after construction, so entries stay valid for the object
+        # lifetime; compare_with_current hits every market once per display
+        self._summary_cache = {}
+
+        # Per-market sorted spread histories for percentile lookups,
+        # populated lazily by _calculate_percentile
+        self._sorted_spreads = {}
+
+        # Named scratch arrays reused across get_* calls via _scratch, so
+        # repeated polling doesn't reallocate the same intermediates
+        self._buf = {}
+
+        # Canonical pair universe, unioned across all hours up front. The
+        # pair set is stable hour to hour, so sorting/set-probing every pair
+        # once per hour (and again in compare_with_current) was pure churn.
+        self._pair_to_mid = {}
+        for analyzer in self.analyzers:
+            for a, b, _ in analyzer._pair_list:
+                if (a, b) not in self._pair_to_mid:
+                    self._pair_to_mid[(a, b)] = f"{a}|{b}"
+
+        # Matrix rows assigned up front from the pair universe, so the hour
+        # loop in _analyze_trends needs no lazy row discovery
+        self._market_ids = list(self._pair_to_mid.values())
+        self._mid_index = {mid: row for row, mid in enumerate(self._market_ids)}
 
         self._analyze_trends()
         self._calculate_divine_base_ratio()
@@ -61,19 +130,20 @@ class TrendAnalyzer:
         """
         divine_base_ratios = []
 
+        base_currency = self.base_currency
         for analyzer in self.analyzers:
-            # Check if there's a direct divine|base_currency market
-            if 'divine' in analyzer.markets and self.base_currency in analyzer.markets['divine']:
+            # Check if there's a direct divine|base_currency market — one
+            # .get chain instead of probing the nested dicts three times
+            divine_markets = analyzer.markets.get('divine')
+            prices = divine_markets.get(base_currency) if divine_markets else None
+            if prices:
                 # Get the median price from min and max
                 # This directly represents how many base currency you get for 1 divine
-                min_price = analyzer.markets['divine'][self.base_currency]['min_price']
-                max_price = analyzer.markets['divine'][self.base_currency]['max_price']
-                ratio = (min_price + max_price) / 2
-                divine_base_ratios.append(ratio)
+                divine_base_ratios.append((prices['min_price'] + prices['max_price']) * 0.5)
 
         # Use the median of all hourly ratios, or default based on realm
         if divine_base_ratios:
-            self.divine_to_base_ratio = statistics.median(divine_base_ratios)
+            self.divine_to_base_ratio = float(np.median(divine_base_ratios))
         else:
             # Fallback: use configured Divine ratios
             self.divine_to_base_ratio = DEFAULT_DIVINE_CHAOS_RATIO if self.base_currency == 'chaos' else DEFAULT_DIVINE_EXALTED_RATIO
@@ -83,36 +153,73 @@ class TrendAnalyzer:
               f"{self.divine_to_base_ratio:.0f} {base_name}")
 
     def _analyze_trends(self):
-        """Analyze patterns across all hours to build trend data."""
+        """Analyze patterns across all hours to build the trend matrices."""
+        # First pass: collect one entry per (market, hour); rows were
+        # preassigned from the canonical pair universe in __init__
+        mid_index = self._mid_index
+        pair_items = list(self._pair_to_mid.items())
+        entries = []
         for hour_idx, analyzer in enumerate(self.analyzers):
-            # Track spread patterns for each market pair
-            processed_pairs = set()
-            for currency_a, trades in analyzer.markets.items():
-                for currency_b, prices in trades.items():
-                    market_pair = tuple(sorted((currency_a, currency_b)))
-                    if market_pair in processed_pairs:
-                        continue
-                    processed_pairs.add(market_pair)
-
-                    # Calculate spread width
-                    if prices['max_price'] > 0:
-                        spread_width = (prices['max_price'] / prices['min_price']) - 1
-                        market_id = f"{market_pair[0]}|{market_pair[1]}"
-
-                        # Track spread data
-                        self.market_history[market_id]['spreads'].append({
-                            'hour_index': hour_idx,
-                            'spread': spread_width,
-                            'min_price': prices['min_price'],
-                            'max_price': prices['max_price'],
-                            'volume': prices.get('volume', {})
-                        })
-
-                        # Track volumes for both currencies
-                        base_volume = prices.get('volume', {}).get(self.base_currency, 0)
-                        divine_volume = prices.get('volume', {}).get('divine', 0)
-                        self.market_history[market_id]['base_volumes'].append(base_volume)
-                        self.market_history[market_id]['divine_volumes'].append(divine_volume)
+            markets = analyzer.markets
+            for (currency_a, currency_b), market_id in pair_items:
+                trades = markets.get(currency_a)
+                prices = trades.get(currency_b) if trades else None
+                if prices is None:
+                    continue
+
+                if prices['max_price'] > 0:
+                    entries.append((mid_index[market_id], hour_idx, prices))
+
+        # Second pass: fill the (markets, hours) matrices
+        shape = (len(self._market_ids), self.hours_analyzed)
+        self._spread_arr = spread_arr = np.full(shape, np.nan)
+        self._minp_arr = minp_arr = np.full(shape, np.nan)
+        self._maxp_arr = maxp_arr = np.full(shape, np.nan)
+        self._basevol_arr = basevol_arr = np.full(shape, np.nan)
+        self._divvol_arr = divvol_arr = np.full(shape, np.nan)
+
+        base_currency = self.base_currency
+        for row, hour_idx, prices in entries:
+            min_price = prices['min_price']
+            max_price = prices['max_price']
+            spread_arr[row, hour_idx] = (max_price / min_price) - 1
+            minp_arr[row, hour_idx] = min_price
+            maxp_arr[row, hour_idx] = max_price
+            volume = prices.get('volume') or {}
+            basevol_arr[row, hour_idx] = volume.get(base_currency, 0)
+            divvol_arr[row, hour_idx] = volume.get('divine', 0)
+
+        # Hours where each market actually traded; reused by every getter
+        self._valid = ~np.isnan(spread_arr)
+
+    def _scratch(self, name, shape=None):
+        """
+        Zeroed scratch array reused across calls, keyed by name.
+        Defaults to one float per market; reallocates only if the
+        requested shape changed (e.g. a different lookback window).
+        """
+        if shape is None:
+            shape = (len(self._market_ids),)
+        buf = self._buf.get(name)
+        if buf is None or buf.shape != shape:
+            buf = self._buf[name] = np.zeros(shape)
+        else:
+            buf.fill(0)
+        return buf
+
+    def _volume_columns(self, B, D):
+        """
+        Per-market volume columns over (markets, hours) matrix slices:
+        sum and count of the positive base and Divine volumes in each row.
+        """
+        with np.errstate(invalid='ignore'):
+            base_pos = B > 0
+            divine_pos = D > 0
+        hours_with_base = base_pos.sum(axis=1)
+        hours_with_divine = divine_pos.sum(axis=1)
+        base_sum = np.where(base_pos, B, 0.0).sum(axis=1)
+        divine_sum = np.where(divine_pos, D, 0.0).sum(axis=1)
+        return base_sum, hours_with_base, divine_sum, hours_with_divine
 
     def get_persistent_spread_markets(self, min_spread=0.2, persistence_threshold=0.5, min_avg_volume=0, top_n=10):
         """
@@ -128,76 +235,125 @@ class TrendAnalyzer:
         Returns:
             List of markets with persistent high spreads
         """
-        persistent_markets = []
-
-        for market_id, history in self.market_history.items():
-            spread_data = history['spreads']
-            if len(spread_data) < 2:  # Need at least 2 hours of data
-                continue
-
-            # Count how many hours showed spread >= min_spread
-            hours_with_spread = sum(1 for d in spread_data if d['spread'] >= min_spread)
-            persistence_ratio = hours_with_spread / len(spread_data)
-
-            if persistence_ratio >= persistence_threshold:
-                spreads = [d['spread'] for d in spread_data]
-                base_volumes = history['base_volumes']
-                divine_volumes = history['divine_volumes']
-
-                # Calculate average volumes for both currencies
-                non_zero_base = [v for v in base_volumes if v > 0]
-                non_zero_divine = [v for v in divine_volumes if v > 0]
-                avg_base_volume = statistics.mean(non_zero_base) if non_zero_base else 0
-                avg_divine_volume = statistics.mean(non_zero_divine) if non_zero_divine else 0
-
-                # Normalize Divine volume to base currency equivalent for fair comparison
-                avg_divine_in_base = avg_divine_volume * self.divine_to_base_ratio
-
-                # Filter by minimum volume (use the higher of base or Divine-in-base)
-                max_avg_volume_in_base = max(avg_base_volume, avg_divine_in_base)
-                if max_avg_volume_in_base < min_avg_volume:
-                    continue
+        S = self._spread_arr
+        B = self._basevol_arr
+        D = self._divvol_arr
+        valid = self._valid
+        if not len(self._market_ids):
+            return []
+
+        # Per-market columns, computed for every market in one pass.
+        # NaN comparisons are False, which is exactly what we want here.
+        apply_vol_filter = min_avg_volume > 0
+        if _market_columns_kernel is not None:
+            # The compiled kernel fuses spread and volume scans into one
+            # pass, so its volume columns come for free either way
+            (total_hours, hours_with_spread, base_sum, hours_with_base,
+             divine_sum, hours_with_divine) = _market_columns_kernel(S, B, D, min_spread)
+        else:
+            total_hours = valid.sum(axis=1)
+            with np.errstate(invalid='ignore'):
+                hours_with_spread = (S >= min_spread).sum(axis=1)
+            if apply_vol_filter:
+                (base_sum, hours_with_base,
+                 divine_sum, hours_with_divine) = self._volume_columns(B, D)
+            else:
+                # No volume filter: defer the volume sweep until the
+                # survivors are known, halving work for the common case
+                base_sum = hours_with_base = divine_sum = hours_with_divine = None
+        persistence = np.divide(
+            hours_with_spread, np.maximum(total_hours, 1),
+            out=self._scratch('persistence')
+        )
 
-                # Calculate volume metrics for both currencies
-                hours_with_base = sum(1 for v in base_volumes if v > 0)
-                hours_with_divine = sum(1 for v in divine_volumes if v > 0)
-                hours_with_volume = max(hours_with_base, hours_with_divine)
-                volume_consistency = hours_with_volume / len(spread_data) if spread_data else 0
-
-                # Get most recent data
-                latest = spread_data[-1]
-
-                persistent_markets.append({
-                    'market_id': market_id,
-                    'persistence_ratio': persistence_ratio,
-                    'hours_with_spread': hours_with_spread,
-                    'total_hours': len(spread_data),
-                    'avg_spread': statistics.mean(spreads),
-                    'median_spread': statistics.median(spreads),
-                    'max_spread': max(spreads),
-                    'min_spread': min(spreads),
-                    'std_dev': statistics.stdev(spreads) if len(spreads) > 1 else 0,
-                    'avg_base_volume': avg_base_volume,
-                    'avg_divine_volume': avg_divine_volume,
-                    'total_base_volume': sum(base_volumes),
-                    'total_divine_volume': sum(divine_volumes),
-                    'hours_with_volume': hours_with_volume,
-                    'volume_consistency': volume_consistency,
-                    'latest_spread': latest['spread'],
-                    'latest_min_price': latest['min_price'],
-                    'latest_max_price': latest['max_price'],
-                    'latest_base_volume': base_volumes[-1] if base_volumes else 0,
-                    'latest_divine_volume': divine_volumes[-1] if divine_volumes else 0
-                })
+        # Persistence and a 2-hour data floor first; the volume threshold
+        # (higher of base or Divine-in-base averages over non-zero hours)
+        # joins the mask only when one was requested
+        keep = (total_hours >= 2) & (persistence >= persistence_threshold)
+        if apply_vol_filter:
+            avg_base_all = np.divide(
+                base_sum, hours_with_base,
+                out=self._scratch('avg_base'), where=hours_with_base > 0
+            )
+            avg_divine_all = np.divide(
+                divine_sum, hours_with_divine,
+                out=self._scratch('avg_divine'), where=hours_with_divine > 0
+            )
+            max_vol_in_base = self._scratch('max_vol')
+            np.multiply(avg_divine_all, self.divine_to_base_ratio, out=max_vol_in_base)
+            np.maximum(avg_base_all, max_vol_in_base, out=max_vol_in_base)
+            keep &= max_vol_in_base >= min_avg_volume
+        rows = np.where(keep)[0]
+        if not rows.size:
+            return []
+
+        # Remaining statistics only for the survivors; volume columns are
+        # sliced when already computed, otherwise swept over just these rows
+        if base_sum is None:
+            (base_sum, hours_with_base,
+             divine_sum, hours_with_divine) = self._volume_columns(B[rows], D[rows])
+        else:
+            base_sum, hours_with_base = base_sum[rows], hours_with_base[rows]
+            divine_sum, hours_with_divine = divine_sum[rows], hours_with_divine[rows]
+        zeros = np.zeros(rows.size)
+        avg_base = np.divide(
+            base_sum, hours_with_base,
+            out=zeros.copy(), where=hours_with_base > 0
+        )
+        avg_divine = np.divide(
+            divine_sum, hours_with_divine,
+            out=zeros.copy(), where=hours_with_divine > 0
+        )
+        S_keep = S[rows]
+        avg_spread = np.nanmean(S_keep, axis=1)
+        hours_with_volume = np.maximum(hours_with_base, hours_with_divine)
+        volume_consistency = hours_with_volume / total_hours[rows]
 
         # Sort by combination of persistence, spread, and volume
         # Higher weight on volume to prioritize liquid markets
-        persistent_markets.sort(
-            key=lambda x: (x['persistence_ratio'] * x['avg_spread'] * (1 + x['volume_consistency'])),
-            reverse=True
-        )
+        score = persistence[rows] * avg_spread * (1 + volume_consistency)
+        if rows.size > top_n:
+            top = np.argpartition(-score, top_n)[:top_n]
+            order = top[np.argsort(-score[top])]
+        else:
+            order = np.argsort(-score)
+
+        # Last traded hour per surviving market, for the 'latest' fields,
+        # and volume totals batched in one sweep over the surviving rows
+        last_col = valid.shape[1] - 1 - np.argmax(valid[rows][:, ::-1], axis=1)
+        total_base_volume = np.nansum(B[rows], axis=1)
+        total_divine_volume = np.nansum(D[rows], axis=1)
 
-        return persistent_markets[:top_n]
+        persistent_markets = []
+        for k in order:
+            row = rows[k]
+            col = last_col[k]
+            spreads = S[row, valid[row]]
+            persistent_markets.append({
+                'market_id': self._market_ids[row],
+                'persistence_ratio': float(persistence[row]),
+                'hours_with_spread': int(hours_with_spread[row]),
+                'total_hours': int(total_hours[row]),
+                'avg_spread': float(avg_spread[k]),
+                'median_spread': float(np.median(spreads)),
+                'max_spread': float(spreads.max()),
+                'min_spread': float(spreads.min()),
+                # keep guarantees total_hours >= 2, so spreads has >= 2 values
+                'std_dev': float(spreads.std(ddof=1)),
+                'avg_base_volume': float(avg_base[k]),
+                'avg_divine_volume': float(avg_divine[k]),
+                'total_base_volume': float(total_base_volume[k]),
+                'total_divine_volume': float(total_divine_volume[k]),
+                'hours_with_volume': int(hours_with_volume[k]),
+                'volume_consistency': float(volume_consistency[k]),
+                'latest_spread': float(S[row, col]),
+                'latest_min_price': float(self._minp_arr[row, col]),
+                'latest_max_price': float(self._maxp_arr[row, col]),
+                'latest_base_volume': float(B[row, col]),
+                'latest_divine_volume': float(D[row, col])
+            })
+
+        return persistent_markets
 
     def get_trending_markets(self, lookback_hours=6, min_avg_volume=100, top_n=10):
         """
@@ -212,66 +368,104 @@ class TrendAnalyzer:
         Returns:
             List of markets with increasing volatility
         """
-        trending_markets = []
-
-        for market_id, history in self.market_history.items():
-            spread_data = history['spreads']
-            if len(spread_data) < lookback_hours:
-                continue
-
-            # Get recent spreads and volumes
-            recent_spreads = [d['spread'] for d in spread_data[-lookback_hours:]]
-            recent_base_volumes = history['base_volumes'][-lookback_hours:]
-            recent_divine_volumes = history['divine_volumes'][-lookback_hours:]
-
-            if len(recent_spreads) < 2:
-                continue
-
-            # Check volume filter for both currencies
-            non_zero_base = [v for v in recent_base_volumes if v > 0]
-            non_zero_divine = [v for v in recent_divine_volumes if v > 0]
-            avg_base_volume = statistics.mean(non_zero_base) if non_zero_base else 0
-            avg_divine_volume = statistics.mean(non_zero_divine) if non_zero_divine else 0
-
-            # Normalize Divine volume to base currency equivalent for fair comparison
-            avg_divine_in_base = avg_divine_volume * self.divine_to_base_ratio
-            max_avg_volume_in_base = max(avg_base_volume, avg_divine_in_base)
-
-            if max_avg_volume_in_base < min_avg_volume:
-                continue
-
-            # Calculate simple linear trend
-            # Positive slope = widening spreads
-            x_values = list(range(len(recent_spreads)))
-            mean_x = statistics.mean(x_values)
-            mean_y = statistics.mean(recent_spreads)
-
-            numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(x_values, recent_spreads))
-            denominator = sum((x - mean_x) ** 2 for x in x_values)
+        S = self._spread_arr
+        if not len(self._market_ids):
+            return []
+
+        lookback = min(lookback_hours, S.shape[1])
+        if lookback < 2:
+            return []
+
+        # Last lookback calendar hours; a market missing any of them gets a
+        # NaN slope below and drops out of the ranking
+        S_recent = S[:, -lookback:]
+        B_recent = self._basevol_arr[:, -lookback:]
+        D_recent = self._divvol_arr[:, -lookback:]
+
+        # Closed-form least-squares slope for every market in one matmul:
+        # with centered x, slope = (y - ȳ) · xc / Σxc².
+        # Positive slope = widening spreads
+        x_centered = np.arange(lookback) - (lookback - 1) / 2
+        denominator = (x_centered * x_centered).sum()
+        centered = self._scratch('slope_work', S_recent.shape)
+        np.subtract(S_recent, S_recent.mean(axis=1, keepdims=True), out=centered)
+        slopes = self._scratch('slopes')
+        np.matmul(centered, x_centered, out=slopes)
+        slopes /= denominator
+
+        # Volume filter for both currencies (non-zero means over the window,
+        # Divine normalized to base equivalents) — only computed across the
+        # full matrix when a threshold was actually requested
+        apply_vol_filter = min_avg_volume > 0
+        if apply_vol_filter:
+            if _market_columns_kernel is not None:
+                (_, _, base_sum, hours_with_base,
+                 divine_sum, hours_with_divine) = _market_columns_kernel(
+                    S_recent, B_recent, D_recent, 0.0)
+            else:
+                (base_sum, hours_with_base,
+                 divine_sum, hours_with_divine) = self._volume_columns(B_recent, D_recent)
+            avg_base_all = np.divide(
+                base_sum, hours_with_base,
+                out=self._scratch('avg_base'), where=hours_with_base > 0
+            )
+            avg_divine_all = np.divide(
+                divine_sum, hours_with_divine,
+                out=self._scratch('avg_divine'), where=hours_with_divine > 0
+            )
+            max_vol_in_base = self._scratch('max_vol')
+            np.multiply(avg_divine_all, self.divine_to_base_ratio, out=max_vol_in_base)
+            np.maximum(avg_base_all, max_vol_in_base, out=max_vol_in_base)
+
+        # Only markets with positive trend (widening spreads) and enough volume
+        with np.errstate(invalid='ignore'):
+            keep = np.isfinite(slopes) & (slopes > 0)
+            if apply_vol_filter:
+                keep &= max_vol_in_base >= min_avg_volume
+        rows = np.where(keep)[0]
+        if not rows.size:
+            return []
+
+        if rows.size > top_n:
+            top = np.argpartition(-slopes[rows], top_n)[:top_n]
+            rows = rows[top[np.argsort(-slopes[rows][top])]]
+        else:
+            rows = rows[np.argsort(-slopes[rows])]
 
-            if denominator == 0:
-                continue
+        # Volume averages for the (at most top_n) survivors
+        if apply_vol_filter:
+            avg_base = avg_base_all[rows]
+            avg_divine = avg_divine_all[rows]
+        else:
+            (base_sum, hours_with_base,
+             divine_sum, hours_with_divine) = self._volume_columns(B_recent[rows], D_recent[rows])
+            zeros = np.zeros(rows.size)
+            avg_base = np.divide(
+                base_sum, hours_with_base,
+                out=zeros.copy(), where=hours_with_base > 0
+            )
+            avg_divine = np.divide(
+                divine_sum, hours_with_divine,
+                out=zeros.copy(), where=hours_with_divine > 0
+            )
 
-            slope = numerator / denominator
-
-            # Only include markets with positive trend (widening spreads)
-            if slope > 0:
-                latest = spread_data[-1]
-                trending_markets.append({
-                    'market_id': market_id,
-                    'trend_slope': slope,
-                    'latest_spread': latest['spread'],
-                    'avg_recent_spread': statistics.mean(recent_spreads),
-                    'spread_change': recent_spreads[-1] - recent_spreads[0],
-                    'hours_analyzed': len(recent_spreads),
-                    'avg_base_volume': avg_base_volume,
-                    'avg_divine_volume': avg_divine_volume,
-                    'latest_base_volume': recent_base_volumes[-1] if recent_base_volumes else 0,
-                    'latest_divine_volume': recent_divine_volumes[-1] if recent_divine_volumes else 0
-                })
-
-        trending_markets.sort(key=lambda x: x['trend_slope'], reverse=True)
-        return trending_markets[:top_n]
+        trending_markets = []
+        for k, row in enumerate(rows):
+            recent = S_recent[row]
+            trending_markets.append({
+                'market_id': self._market_ids[row],
+                'trend_slope': float(slopes[row]),
+                'latest_spread': float(recent[-1]),
+                'avg_recent_spread': float(recent.mean()),
+                'spread_change': float(recent[-1] - recent[0]),
+                'hours_analyzed': lookback,
+                'avg_base_volume': float(avg_base[k]),
+                'avg_divine_volume': float(avg_divine[k]),
+                'latest_base_volume': float(B_recent[row, -1]),
+                'latest_divine_volume': float(D_recent[row, -1])
+            })
+
+        return trending_markets
 
     def get_market_summary(self, market_id):
         """
@@ -283,27 +477,39 @@ class TrendAnalyzer:
         Returns:
             Dictionary with comprehensive market statistics
         """
-        if market_id not in self.market_history:
+        summary = self._summary_cache.get(market_id)
+        if summary is not None:
+            return summary
+
+        row = self._mid_index.get(market_id)
+        if row is None:
             return None
 
-        history = self.market_history[market_id]
-        spread_data = history['spreads']
-        spreads = [d['spread'] for d in spread_data]
-        base_volumes = history['base_volumes']
-        divine_volumes = history['divine_volumes']
+        v = self._valid[row]
+        spreads = self._spread_arr[row, v]
+        if not spreads.size:
+            # Pair known but never traded in the window
+            return None
+
+        base_volumes = self._basevol_arr[row, v]
+        divine_volumes = self._divvol_arr[row, v]
+        non_zero_base = base_volumes[base_volumes > 0]
+        non_zero_divine = divine_volumes[divine_volumes > 0]
 
-        return {
+        summary = {
             'market_id': market_id,
-            'hours_tracked': len(spread_data),
-            'avg_spread': statistics.mean(spreads),
-            'median_spread': statistics.median(spreads),
-            'max_spread': max(spreads),
-            'min_spread': min(spreads),
-            'std_dev': statistics.stdev(spreads) if len(spreads) > 1 else 0,
-            'avg_base_volume': statistics.mean([v for v in base_volumes if v > 0]) if any(v > 0 for v in base_volumes) else 0,
-            'avg_divine_volume': statistics.mean([v for v in divine_volumes if v > 0]) if any(v > 0 for v in divine_volumes) else 0,
-            'spread_data': spread_data
+            'hours_tracked': int(spreads.size),
+            'avg_spread': float(spreads.mean()),
+            'median_spread': float(np.median(spreads)),
+            'max_spread': float(spreads.max()),
+            'min_spread': float(spreads.min()),
+            'std_dev': float(spreads.std(ddof=1)) if spreads.size > 1 else 0,
+            'avg_base_volume': float(non_zero_base.mean()) if non_zero_base.size else 0,
+            'avg_divine_volume': float(non_zero_divine.mean()) if non_zero_divine.size else 0,
+            'spreads': spreads
         }
+        self._summary_cache[market_id] = summary
+        return summary
 
     def display_persistent_markets(self, min_spread=0.2, persistence_threshold=0.5, min_avg_volume=100, top_n=10):
         """
@@ -315,18 +521,21 @@ class TrendAnalyzer:
             min_avg_volume: Minimum average volume in base currency equivalents (default 100)
             top_n: Number of markets to display
         """
+        out = []
+        rule = "=" * 80
         base_name = self.base_currency.capitalize()
-        print(f"\n{'='*80}")
-        print(f"PERSISTENT VOLATILITY ANALYSIS ({self.hours_analyzed} hours analyzed)")
-        print(f"Showing markets with >{min_spread:.1%} spread in >{persistence_threshold:.0%} of hours")
-        print(f"Minimum average volume: {min_avg_volume:,.0f} {base_name} equivalent")
-        print(f"(Using Divine/{base_name} ratio: 1 Divine ≈ {self.divine_to_base_ratio:.0f} {base_name})")
-        print(f"{'='*80}")
+        out.append(f"\n{rule}")
+        out.append(f"PERSISTENT VOLATILITY ANALYSIS ({self.hours_analyzed} hours analyzed)")
+        out.append(f"Showing markets with >{min_spread:.1%} spread in >{persistence_threshold:.0%} of hours")
+        out.append(f"Minimum average volume: {min_avg_volume:,.0f} {base_name} equivalent")
+        out.append(f"(Using Divine/{base_name} ratio: 1 Divine ≈ {self.divine_to_base_ratio:.0f} {base_name})")
+        out.append(rule)
 
         markets = self.get_persistent_spread_markets(min_spread, persistence_threshold, min_avg_volume, top_n)
 
         if not markets:
-            print(f"\nNo markets found meeting criteria.")
+            out.append(f"\nNo markets found meeting criteria.")
+            sys.stdout.write("\n".join(out) + "\n")
             return
 
         # Get the most recent analyzer for percentile calculations
@@ -334,40 +543,41 @@ class TrendAnalyzer:
 
         for i, market in enumerate(markets, 1):
             currencies = market['market_id'].split('|')
-            print(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
-            print(f"   Persistence: {market['hours_with_spread']}/{market['total_hours']} hours ({market['persistence_ratio']:.1%})")
-            print(f"   Average Spread: {market['avg_spread']:.2%} (σ={market['std_dev']:.2%})")
-            print(f"   Spread Range: {market['min_spread']:.2%} to {market['max_spread']:.2%}")
-            print(f"   Latest Spread: {market['latest_spread']:.2%}")
+            out.append(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
+            out.append(f"   Persistence: {market['hours_with_spread']}/{market['total_hours']} hours ({market['persistence_ratio']:.1%})")
+            out.append(f"   Average Spread: {market['avg_spread']:.2%} (σ={market['std_dev']:.2%})")
+            out.append(f"   Spread Range: {market['min_spread']:.2%} to {market['max_spread']:.2%}")
+            out.append(f"   Latest Spread: {market['latest_spread']:.2%}")
 
             # Volume/throughput metrics
-            print(f"   Volume Metrics:")
+            out.append(f"   Volume Metrics:")
 
             # Display base currency volume if present
             if market['avg_base_volume'] > 0:
-                print(f"      {base_name} Average: {market['avg_base_volume']:,.0f}/hour")
-                print(f"      {base_name} Total ({self.hours_analyzed}h): {market['total_base_volume']:,.0f}")
+                out.append(f"      {base_name} Average: {market['avg_base_volume']:,.0f}/hour")
+                out.append(f"      {base_name} Total ({self.hours_analyzed}h): {market['total_base_volume']:,.0f}")
                 if market['latest_base_volume'] > 0:
                     base_trend = "↑" if market['latest_base_volume'] > market['avg_base_volume'] else "↓"
                     base_percentile = latest_analyzer._get_volume_percentile(
                         market['latest_base_volume'],
                         latest_analyzer.market_base_volumes
                     )
-                    print(f"      {base_name} Latest: {market['latest_base_volume']:,.0f} ({base_percentile:.0f}th percentile) {base_trend}")
+                    out.append(f"      {base_name} Latest: {market['latest_base_volume']:,.0f} ({base_percentile:.0f}th percentile) {base_trend}")
 
             # Display Divine volume if present
             if market['avg_divine_volume'] > 0:
-                print(f"      Divine Average: {market['avg_divine_volume']:,.0f}/hour")
-                print(f"      Divine Total ({self.hours_analyzed}h): {market['total_divine_volume']:,.0f}")
+                out.append(f"      Divine Average: {market['avg_divine_volume']:,.0f}/hour")
+                out.append(f"      Divine Total ({self.hours_analyzed}h): {market['total_divine_volume']:,.0f}")
                 if market['latest_divine_volume'] > 0:
                     divine_trend = "↑" if market['latest_divine_volume'] > market['avg_divine_volume'] else "↓"
                     divine_percentile = latest_analyzer._get_volume_percentile(
                         market['latest_divine_volume'],
                         latest_analyzer.market_divine_volumes
                     )
-                    print(f"      Divine Latest: {market['latest_divine_volume']:,.0f} ({divine_percentile:.0f}th percentile) {divine_trend}")
+                    out.append(f"      Divine Latest: {market['latest_divine_volume']:,.0f} ({divine_percentile:.0f}th percentile) {divine_trend}")
 
-            print(f"      Consistency: {market['hours_with_volume']}/{market['total_hours']} hours ({market['volume_consistency']:.1%})")
+            out.append(f"      Consistency: {market['hours_with_volume']}/{market['total_hours']} hours ({market['volume_consistency']:.1%})")
+        sys.stdout.write("\n".join(out) + "\n")
 
     def display_trending_markets(self, lookback_hours=6, min_avg_volume=100, top_n=10):
         """
@@ -378,18 +588,21 @@ class TrendAnalyzer:
             min_avg_volume: Minimum average volume in base currency equivalents (default 100)
             top_n: Number of markets to display
         """
+        out = []
+        rule = "=" * 80
         base_name = self.base_currency.capitalize()
-        print(f"\n{'='*80}")
-        print(f"TRENDING VOLATILITY ANALYSIS (Last {lookback_hours} hours)")
-        print(f"Markets where spreads are widening (increasing volatility)")
-        print(f"Minimum average volume: {min_avg_volume:,.0f} {base_name} equivalent")
-        print(f"(Using Divine/{base_name} ratio: 1 Divine ≈ {self.divine_to_base_ratio:.0f} {base_name})")
-        print(f"{'='*80}")
+        out.append(f"\n{rule}")
+        out.append(f"TRENDING VOLATILITY ANALYSIS (Last {lookback_hours} hours)")
+        out.append(f"Markets where spreads are widening (increasing volatility)")
+        out.append(f"Minimum average volume: {min_avg_volume:,.0f} {base_name} equivalent")
+        out.append(f"(Using Divine/{base_name} ratio: 1 Divine ≈ {self.divine_to_base_ratio:.0f} {base_name})")
+        out.append(rule)
 
         markets = self.get_trending_markets(lookback_hours, min_avg_volume, top_n)
 
         if not markets:
-            print(f"\nNo trending markets found meeting criteria.")
+            out.append(f"\nNo trending markets found meeting criteria.")
+            sys.stdout.write("\n".join(out) + "\n")
             return
 
         # Get the most recent analyzer for percentile calculations
@@ -397,11 +610,11 @@ class TrendAnalyzer:
 
         for i, market in enumerate(markets, 1):
             currencies = market['market_id'].split('|')
-            print(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
-            print(f"   Trend Strength: {market['trend_slope']:.4f} (positive = widening)")
-            print(f"   Current Spread: {market['latest_spread']:.2%}")
-            print(f"   Average (last {market['hours_analyzed']}h): {market['avg_recent_spread']:.2%}")
-            print(f"   Change: {market['spread_change']:+.2%}")
+            out.append(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
+            out.append(f"   Trend Strength: {market['trend_slope']:.4f} (positive = widening)")
+            out.append(f"   Current Spread: {market['latest_spread']:.2%}")
+            out.append(f"   Average (last {market['hours_analyzed']}h): {market['avg_recent_spread']:.2%}")
+            out.append(f"   Change: {market['spread_change']:+.2%}")
 
             # Display volume for both currencies with percentiles
             volume_parts = []
@@ -425,7 +638,8 @@ class TrendAnalyzer:
                 )
 
             if volume_parts:
-                print(f"   Volume: {' | '.join(volume_parts)}")
+                out.append(f"   Volume: {' | '.join(volume_parts)}")
+        sys.stdout.write("\n".join(out) + "\n")
 
     def compare_with_current(self, current_analyzer):
         """
@@ -440,59 +654,72 @@ class TrendAnalyzer:
         """
         opportunities_with_context = []
 
-        # Get current spread opportunities
-        processed_pairs = set()
-        for currency_a, trades in current_analyzer.markets.items():
-            for currency_b, prices in trades.items():
-                market_pair = tuple(sorted((currency_a, currency_b)))
-                if market_pair in processed_pairs:
-                    continue
-                processed_pairs.add(market_pair)
-
-                market_id = f"{market_pair[0]}|{market_pair[1]}"
+        # Walk the historical pair universe; pairs only present in the
+        # current hour would have no historical summary anyway.
+        # Hot-loop attributes bound as locals (LOAD_FAST vs LOAD_ATTR)
+        markets = current_analyzer.markets
+        base_currency = self.base_currency
+        get_summary = self.get_market_summary
+        calc_percentile = self._calculate_percentile
+        append = opportunities_with_context.append
+        for (currency_a, currency_b), market_id in self._pair_to_mid.items():
+            trades = markets.get(currency_a)
+            prices = trades.get(currency_b) if trades else None
+            if prices is None:
+                continue
 
-                if prices['max_price'] > 0:
-                    current_spread = (prices['max_price'] / prices['min_price']) - 1
-
-                    # Get historical context
-                    historical_summary = self.get_market_summary(market_id)
-
-                    if historical_summary and current_spread > 0.001:
-                        # Get current volumes
-                        current_base_vol = prices.get('volume', {}).get(self.base_currency, 0)
-                        current_divine_vol = prices.get('volume', {}).get('divine', 0)
-
-                        # Calculate volume comparison
-                        hist_avg_base = historical_summary['avg_base_volume']
-                        hist_avg_divine = historical_summary['avg_divine_volume']
-
-                        opportunities_with_context.append({
-                            'market_id': market_id,
-                            'current_spread': current_spread,
-                            'historical_avg': historical_summary['avg_spread'],
-                            'historical_max': historical_summary['max_spread'],
-                            'historical_median': historical_summary['median_spread'],
-                            'hours_tracked': historical_summary['hours_tracked'],
-                            'vs_avg': current_spread - historical_summary['avg_spread'],
-                            'percentile': self._calculate_percentile(current_spread, historical_summary['spread_data']),
-                            'current_base_volume': current_base_vol,
-                            'current_divine_volume': current_divine_vol,
-                            'avg_base_volume': hist_avg_base,
-                            'avg_divine_volume': hist_avg_divine
-                        })
+            if prices['max_price'] > 0:
+                current_spread = (prices['max_price'] / prices['min_price']) - 1
+
+                # Get historical context
+                historical_summary = get_summary(market_id)
+
+                if historical_summary and current_spread > 0.001:
+                    # Get current volumes
+                    current_base_vol = prices.get('volume', {}).get(base_currency, 0)
+                    current_divine_vol = prices.get('volume', {}).get('divine', 0)
+
+                    # Calculate volume comparison
+                    hist_avg_base = historical_summary['avg_base_volume']
+                    hist_avg_divine = historical_summary['avg_divine_volume']
+
+                    append({
+                        'market_id': market_id,
+                        'current_spread': current_spread,
+                        'historical_avg': historical_summary['avg_spread'],
+                        'historical_max': historical_summary['max_spread'],
+                        'historical_median': historical_summary['median_spread'],
+                        'hours_tracked': historical_summary['hours_tracked'],
+                        'vs_avg': current_spread - historical_summary['avg_spread'],
+                        'percentile': calc_percentile(current_spread, market_id),
+                        'current_base_volume': current_base_vol,
+                        'current_divine_volume': current_divine_vol,
+                        'avg_base_volume': hist_avg_base,
+                        'avg_divine_volume': hist_avg_divine
+                    })
 
         # Sort by how much current spread exceeds historical average
         opportunities_with_context.sort(key=lambda x: x['vs_avg'], reverse=True)
 
         return opportunities_with_context
 
-    def _calculate_percentile(self, value, spread_data):
+    def _calculate_percentile(self, value, market_id):
         """Calculate what percentile the current value is in historical data."""
-        spreads = [d['spread'] for d in spread_data]
-        spreads.sort()
-
-        count_below = sum(1 for s in spreads if s < value)
-        return (count_below / len(spreads)) * 100 if spreads else 0
+        # Sort each market's spread history once and reuse it; searchsorted
+        # on the sorted array counts values strictly below in O(log N)
+        sorted_spreads = self._sorted_spreads.get(market_id)
+        if sorted_spreads is None:
+            row = self._mid_index.get(market_id)
+            if row is None:
+                return 0
+            sorted_spreads = np.sort(self._spread_arr[row, self._valid[row]])
+            self._sorted_spreads[market_id] = sorted_spreads
+
+        if not sorted_spreads.size:
+            return 0
+
+        count_below = np.searchsorted(sorted_spreads, value)
+        return (count_below / sorted_spreads.size) * 100
 
     def display_current_vs_historical(self, current_analyzer, top_n=10):
         """
@@ -502,28 +729,31 @@ class TrendAnalyzer:
             current_analyzer: MarketAnalyzer for current hour
             top_n: Number of opportunities to display
         """
-        print(f"\n{'='*80}")
-        print(f"CURRENT HOUR vs HISTORICAL AVERAGE")
-        print(f"Comparing latest data against {self.hours_analyzed} hour average")
-        print(f"{'='*80}")
+        out = []
+        rule = "=" * 80
+        out.append(f"\n{rule}")
+        out.append(f"CURRENT HOUR vs HISTORICAL AVERAGE")
+        out.append(f"Comparing latest data against {self.hours_analyzed} hour average")
+        out.append(rule)
 
         opportunities = self.compare_with_current(current_analyzer)
 
         if not opportunities:
-            print("\nNo current opportunities with historical data.")
+            out.append("\nNo current opportunities with historical data.")
+            sys.stdout.write("\n".join(out) + "\n")
             return
 
         for i, opp in enumerate(opportunities[:top_n], 1):
             currencies = opp['market_id'].split('|')
-            print(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
-            print(f"   Current Spread: {opp['current_spread']:.2%} (Percentile: {opp['percentile']:.0f}th)")
-            print(f"   Historical Average: {opp['historical_avg']:.2%}")
-            print(f"   Historical Range: {opp['historical_median']:.2%} to {opp['historical_max']:.2%}")
+            out.append(f"\n{i}. {currencies[0].upper()} <-> {currencies[1].upper()}")
+            out.append(f"   Current Spread: {opp['current_spread']:.2%} (Percentile: {opp['percentile']:.0f}th)")
+            out.append(f"   Historical Average: {opp['historical_avg']:.2%}")
+            out.append(f"   Historical Range: {opp['historical_median']:.2%} to {opp['historical_max']:.2%}")
 
             if opp['vs_avg'] > 0:
-                print(f"   Status: ⚠️  ABOVE AVERAGE by {opp['vs_avg']:.2%} (unusual volatility)")
+                out.append(f"   Status: ⚠️  ABOVE AVERAGE by {opp['vs_avg']:.2%} (unusual volatility)")
             else:
-                print(f"   Status: ✓ Normal (within historical range)")
+                out.append(f"   Status: ✓ Normal (within historical range)")
 
             # Display volume information with comparison and percentiles
             volume_parts = []
@@ -564,4 +794,5 @@ class TrendAnalyzer:
                 )
 
             if volume_parts:
-                print(f"   Volume: {' | '.join(volume_parts)}")
+                out.append(f"   Volume: {' | '.join(volume_parts)}")
+        sys.stdout.write("\n".join(out) + "\n")